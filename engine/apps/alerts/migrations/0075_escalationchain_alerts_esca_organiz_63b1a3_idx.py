@@ -0,0 +1,17 @@
+# Generated by Django 4.2.15 on 2026-10-15 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0074_alter_escalationpolicy_step'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='escalationchain',
+            index=models.Index(fields=['organization', 'team'], name='alerts_esca_organiz_63b1a3_idx'),
+        ),
+    ]
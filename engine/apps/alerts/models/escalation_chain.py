@@ -52,6 +52,9 @@ class EscalationChain(models.Model):
 
     class Meta:
         unique_together = ("organization", "name")
+        indexes = [
+            models.Index(fields=["organization", "team"]),
+        ]
 
     def __str__(self):
         return f"{self.pk}: {self.name}"
@@ -65,12 +65,12 @@ class ScheduleBaseSerializer(EagerLoadingMixin, serializers.ModelSerializer):
 
     def get_on_call_now(self, obj):
         # Serializer context is set here: apps.api.views.schedule.ScheduleView.get_serializer_context
-        users = self.context["oncall_users"].get(obj, [])
+        users = self.context.get("oncall_users", {}).get(obj, [])
         organization = self.context["request"].auth.organization
         return [user.short(organization) for user in users]
 
     def get_number_of_escalation_chains(self, obj):
-        # num_escalation_chains param added in queryset via annotate. Check ScheduleView.get_queryset
+        # num_escalation_chains param attached to fetched schedules. Check ScheduleView._annotate_schedules
         # return 0 for just created schedules
         num = getattr(obj, "num_escalation_chains", 0)
         return num or 0
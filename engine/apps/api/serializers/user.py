@@ -274,10 +274,17 @@ class ScheduleUserSerializer(ListUserSerializer):
         "telegram_configuration",
     ]
 
+    SELECT_RELATED = ["organization", "slack_user_identity", "telegram_connection"]
+    PREFETCH_RELATED = []
+
+    def __init__(self, *args, **kwargs):
+        # only build the fields which are kept, avoid computing the discarded ones (e.g. notification chain verbal)
+        kwargs.setdefault("fields", self.fields_to_keep)
+        super().__init__(*args, **kwargs)
+
     def to_representation(self, instance):
-        serialized = super(ListUserSerializer, self).to_representation(instance)
-        ret = {field: value for field, value in serialized.items() if field in self.fields_to_keep}
-        return ret
+        # fields are already pruned in __init__, skip ListUserSerializer phone number masking (no phone fields kept)
+        return super(ListUserSerializer, self).to_representation(instance)
 
 
 class FastUserSerializer(serializers.ModelSerializer):
@@ -1,10 +1,13 @@
 import json
+from unittest.mock import patch
 
 import pytest
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from apps.api.permissions import LegacyAccessControlRole
 from common.api_helpers.filters import NO_TEAM_VALUE
 
 
@@ -41,6 +44,27 @@ def test_update_escalation_chain(escalation_chain_internal_api_setup, make_user_
     assert response.status_code == status.HTTP_200_OK
 
 
+@patch("apps.api.views.escalation_chain.write_resource_insight_log")
+@pytest.mark.django_db
+def test_update_escalation_chain_insight_logs(
+    mock_write_resource_insight_log,
+    escalation_chain_internal_api_setup,
+    make_user_auth_headers,
+):
+    user, token, escalation_chain = escalation_chain_internal_api_setup
+    prev_name = escalation_chain.name
+
+    client = APIClient()
+    url = reverse("api-internal:escalation_chain-detail", kwargs={"pk": escalation_chain.public_primary_key})
+    response = client.put(url, data={"name": "updated"}, format="json", **make_user_auth_headers(user, token))
+    assert response.status_code == status.HTTP_200_OK
+
+    mock_write_resource_insight_log.assert_called_once()
+    call_kwargs = mock_write_resource_insight_log.call_args.kwargs
+    assert call_kwargs["prev_state"]["name"] == prev_name
+    assert call_kwargs["new_state"]["name"] == "updated"
+
+
 @pytest.mark.django_db
 def test_list_escalation_chains(escalation_chain_internal_api_setup, make_user_auth_headers):
     user, token, escalation_chain = escalation_chain_internal_api_setup
@@ -61,6 +85,61 @@ def test_list_escalation_chains(escalation_chain_internal_api_setup, make_user_a
     ]
 
 
+@pytest.mark.django_db
+def test_list_escalation_chains_num_integrations_and_routes(
+    escalation_chain_internal_api_setup,
+    make_alert_receive_channel,
+    make_channel_filter,
+    make_user_auth_headers,
+):
+    user, token, escalation_chain = escalation_chain_internal_api_setup
+    organization = escalation_chain.organization
+
+    alert_receive_channel = make_alert_receive_channel(organization)
+    make_channel_filter(alert_receive_channel, escalation_chain=escalation_chain, is_default=True)
+    make_channel_filter(alert_receive_channel, escalation_chain=escalation_chain, filtering_term="a")
+    other_alert_receive_channel = make_alert_receive_channel(organization)
+    make_channel_filter(other_alert_receive_channel, escalation_chain=escalation_chain, is_default=True)
+    # routes of deleted integrations are not counted
+    deleted_alert_receive_channel = make_alert_receive_channel(organization, deleted_at=timezone.now())
+    make_channel_filter(deleted_alert_receive_channel, escalation_chain=escalation_chain, is_default=True)
+
+    client = APIClient()
+    url = reverse("api-internal:escalation_chain-list")
+    response = client.get(url, **make_user_auth_headers(user, token))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()[0]["number_of_integrations"] == 2
+    assert response.json()[0]["number_of_routes"] == 3
+
+
+@pytest.mark.django_db
+def test_list_escalation_chains_available_teams(
+    make_organization_and_user_with_plugin_token,
+    make_user_for_organization,
+    make_team,
+    make_escalation_chain,
+    make_user_auth_headers,
+):
+    organization, user, token = make_organization_and_user_with_plugin_token(role=LegacyAccessControlRole.EDITOR)
+    other_user = make_user_for_organization(organization)
+
+    user_team = make_team(organization)
+    user_team.users.add(user, other_user)
+    other_team = make_team(organization)
+    other_team.users.add(other_user)
+
+    user_team_escalation_chain = make_escalation_chain(organization, team=user_team)
+    make_escalation_chain(organization, team=other_team)
+
+    client = APIClient()
+    url = reverse("api-internal:escalation_chain-list")
+    response = client.get(url, **make_user_auth_headers(user, token))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [e["id"] for e in response.json()] == [user_team_escalation_chain.public_primary_key]
+
+
 @pytest.mark.django_db
 def test_list_escalation_chains_filters(escalation_chain_internal_api_setup, make_user_auth_headers):
     user, token, escalation_chain = escalation_chain_internal_api_setup
@@ -78,6 +157,25 @@ def test_list_escalation_chains_filters(escalation_chain_internal_api_setup, mak
     ]
 
 
+@pytest.mark.django_db
+def test_list_escalation_chains_filters_ordered_by_name(
+    make_organization_and_user_with_plugin_token,
+    make_escalation_chain,
+    make_user_auth_headers,
+):
+    organization, user, token = make_organization_and_user_with_plugin_token()
+    make_escalation_chain(organization, name="b")
+    make_escalation_chain(organization, name="c")
+    make_escalation_chain(organization, name="a")
+
+    client = APIClient()
+    url = reverse("api-internal:escalation_chain-list") + "?filters=true"
+    response = client.get(url, **make_user_auth_headers(user, token))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [e["display_name"] for e in response.json()] == ["a", "b", "c"]
+
+
 @pytest.mark.django_db
 @pytest.mark.parametrize(
     "team_name,new_team_name",
@@ -134,6 +232,31 @@ def test_escalation_chain_copy_empty_name(
     assert response.status_code == status.HTTP_400_BAD_REQUEST
 
 
+@pytest.mark.django_db
+def test_escalation_chain_copy_name_already_exists(
+    make_organization_and_user_with_plugin_token,
+    make_user_auth_headers,
+    make_escalation_chain,
+):
+    organization, user, token = make_organization_and_user_with_plugin_token()
+    escalation_chain = make_escalation_chain(organization)
+    other_escalation_chain = make_escalation_chain(organization)
+
+    client = APIClient()
+    url = reverse("api-internal:escalation_chain-copy", kwargs={"pk": escalation_chain.public_primary_key})
+
+    response = client.post(
+        url,
+        {"name": other_escalation_chain.name, "team": NO_TEAM_VALUE},
+        format="json",
+        **make_user_auth_headers(user, token),
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json() == {"name": ["Escalation chain with this name already exists."]}
+    assert organization.escalation_chains.count() == 2
+
+
 @pytest.mark.django_db
 def test_team_not_updated_if_not_in_data(
     make_organization_and_user_with_plugin_token,
@@ -156,3 +279,64 @@ def test_team_not_updated_if_not_in_data(
 
     escalation_chain.refresh_from_db()
     assert escalation_chain.team == team
+
+
+@pytest.mark.django_db
+def test_escalation_chain_details(
+    escalation_chain_internal_api_setup,
+    make_alert_receive_channel,
+    make_channel_filter,
+    make_user_auth_headers,
+):
+    user, token, escalation_chain = escalation_chain_internal_api_setup
+    organization = escalation_chain.organization
+
+    alert_receive_channel = make_alert_receive_channel(organization, verbal_name=":fire: Integration")
+    default_channel_filter = make_channel_filter(
+        alert_receive_channel, escalation_chain=escalation_chain, is_default=True
+    )
+    channel_filter = make_channel_filter(alert_receive_channel, escalation_chain=escalation_chain, filtering_term="a")
+    other_alert_receive_channel = make_alert_receive_channel(organization, verbal_name="Other integration")
+    other_channel_filter = make_channel_filter(
+        other_alert_receive_channel, escalation_chain=escalation_chain, is_default=True
+    )
+    deleted_alert_receive_channel = make_alert_receive_channel(organization, deleted_at=timezone.now())
+    make_channel_filter(deleted_alert_receive_channel, escalation_chain=escalation_chain, is_default=True)
+
+    client = APIClient()
+    url = reverse("api-internal:escalation_chain-details", kwargs={"pk": escalation_chain.public_primary_key})
+    response = client.get(url, **make_user_auth_headers(user, token))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == [
+        {
+            "id": alert_receive_channel.public_primary_key,
+            "display_name": "🔥 Integration",
+            "channel_filters": [
+                {"id": channel_filter.public_primary_key, "display_name": "a"},
+                {"id": default_channel_filter.public_primary_key, "display_name": "Default Route"},
+            ],
+        },
+        {
+            "id": other_alert_receive_channel.public_primary_key,
+            "display_name": "Other integration",
+            "channel_filters": [
+                {"id": other_channel_filter.public_primary_key, "display_name": "Default Route"},
+            ],
+        },
+    ]
+
+
+@pytest.mark.django_db
+def test_escalation_chain_filters(make_organization_and_user_with_plugin_token, make_user_auth_headers):
+    _, user, token = make_organization_and_user_with_plugin_token()
+
+    client = APIClient()
+    url = reverse("api-internal:escalation_chain-filters")
+    response = client.get(url, **make_user_auth_headers(user, token))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == [
+        {"name": "search", "type": "search"},
+        {"name": "team", "type": "team_select", "href": "/api/internal/v1/teams/", "global": True},
+    ]
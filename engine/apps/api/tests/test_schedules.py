@@ -460,6 +460,18 @@ def test_get_list_schedules_by_mine(
     assert set(schedule_names) == set(expected_schedule_names)
 
 
+@pytest.mark.django_db
+@pytest.mark.parametrize("query_param", ["?mine=invalid", "?used=invalid"])
+def test_get_list_schedules_invalid_bool_filter(schedule_internal_api_setup, make_user_auth_headers, query_param):
+    user, token, _, _, _, _ = schedule_internal_api_setup
+    client = APIClient()
+
+    url = reverse("api-internal:schedule-list") + query_param
+    response = client.get(url, format="json", **make_user_auth_headers(user, token))
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
 @pytest.mark.django_db
 def test_get_list_schedules_pagination_respects_search(
     schedule_internal_api_setup,
@@ -2266,6 +2278,37 @@ def test_get_schedule_from_other_team_with_flag(
     assert response.status_code == status.HTTP_200_OK
 
 
+@pytest.mark.django_db
+def test_list_schedules_available_teams(
+    make_organization_and_user_with_plugin_token,
+    make_user_for_organization,
+    make_team,
+    make_user_auth_headers,
+    make_schedule,
+):
+    organization, user, token = make_organization_and_user_with_plugin_token(role=LegacyAccessControlRole.EDITOR)
+    other_user = make_user_for_organization(organization)
+
+    user_team = make_team(organization)
+    user_team.users.add(user, other_user)
+    other_team = make_team(organization)
+    other_team.users.add(other_user)
+
+    no_team_schedule = make_schedule(organization, schedule_class=OnCallScheduleWeb)
+    user_team_schedule = make_schedule(organization, schedule_class=OnCallScheduleWeb, team=user_team)
+    make_schedule(organization, schedule_class=OnCallScheduleWeb, team=other_team)
+
+    client = APIClient()
+    url = reverse("api-internal:schedule-list")
+    response = client.get(url, format="json", **make_user_auth_headers(user, token))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [s["id"] for s in response.json()["results"]] == [
+        no_team_schedule.public_primary_key,
+        user_team_schedule.public_primary_key,
+    ]
+
+
 @pytest.mark.django_db
 def test_get_schedule_on_call_now(
     make_organization, make_user_for_organization, make_token_for_organization, make_schedule, make_user_auth_headers
@@ -2619,3 +2662,21 @@ def test_can_update_user_groups(
     assert response.status_code == status.HTTP_200_OK
     assert response.json()["warnings"] == []
     mock_user_group_can_be_updated.assert_called_once()  # should be called for active user group (is_active=True)
+
+
+@pytest.mark.django_db
+def test_schedule_metadata_does_not_compute_oncall_users(
+    make_organization_and_user_with_plugin_token,
+    make_schedule,
+    make_user_auth_headers,
+):
+    organization, user, token = make_organization_and_user_with_plugin_token()
+    schedule = make_schedule(organization, schedule_class=OnCallScheduleWeb)
+
+    client = APIClient()
+    url = reverse("api-internal:schedule-detail", kwargs={"pk": schedule.public_primary_key})
+    with patch("apps.api.views.schedule.get_oncall_users_for_multiple_schedules") as mock_get_oncall_users:
+        response = client.options(url, **make_user_auth_headers(user, token))
+
+    assert response.status_code == status.HTTP_200_OK
+    mock_get_oncall_users.assert_not_called()
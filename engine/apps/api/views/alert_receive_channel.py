@@ -217,9 +217,8 @@ class AlertReceiveChannelView(
         instance.delete()
 
     def get_queryset(self, eager=True, ignore_filtering_by_available_teams=False):
-        is_filters_request = self.request.query_params.get("filters", "false") == "true"
         organization = self.request.auth.organization
-        if is_filters_request:
+        if self.is_filters_request:
             queryset = AlertReceiveChannel.objects_with_maintenance.filter(
                 organization=organization,
             )
@@ -1,4 +1,10 @@
-from django.db.models import Count, Q
+from functools import lru_cache
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import IntegrityError
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django_filters import rest_framework as filters
 from drf_spectacular.utils import PolymorphicProxySerializer, extend_schema, extend_schema_view, inline_serializer
 from emoji import emojize
@@ -8,7 +14,7 @@ from rest_framework.filters import SearchFilter
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from apps.alerts.models import EscalationChain
+from apps.alerts.models import ChannelFilter, EscalationChain
 from apps.api.permissions import RBACPermission
 from apps.api.serializers.escalation_chain import (
     EscalationChainListSerializer,
@@ -33,6 +39,22 @@ from common.api_helpers.mixins import (
 )
 from common.insight_log import EntityEvent, write_resource_insight_log
 
+FILTER_OPTIONS = [
+    {"name": "search", "type": "search"},
+    {
+        "name": "team",
+        "type": "team_select",
+        "href": "/api/internal/v1/teams/",
+        "global": True,
+    },
+]
+
+
+@lru_cache(maxsize=4096)
+def _emojize_alias(text: str) -> str:
+    # integration names repeat across requests, avoid parsing emoji aliases every time
+    return emojize(text, language="alias")
+
 
 class EscalationChainFilter(ByTeamModelFieldFilterMixin, ModelFieldFilterMixin, filters.FilterSet):
     team = TeamModelMultipleChoiceFilter()
@@ -90,32 +112,48 @@ class EscalationChainViewSet(
     filter_serializer_class = FilterEscalationChainSerializer
 
     def get_queryset(self, ignore_filtering_by_available_teams=False):
-        is_filters_request = self.request.query_params.get("filters", "false") == "true"
-
         queryset = EscalationChain.objects.filter(
             organization=self.request.auth.organization,
         )
 
         if not ignore_filtering_by_available_teams:
-            queryset = queryset.filter(*self.available_teams_lookup_args).distinct()
+            available_teams_lookup_args = self.available_teams_lookup_args
+            if available_teams_lookup_args:
+                # filtering by team users may return duplicates, use a semi-join instead of .distinct()
+                queryset = queryset.filter(pk__in=queryset.filter(*available_teams_lookup_args).values("pk"))
 
-        if is_filters_request:
+        if self.is_filters_request:
             # Do not annotate num_integrations and num_routes for filters request,
-            # only fetch public_primary_key and name fields needed by FilterEscalationChainSerializer
-            return queryset.only("public_primary_key", "name")
+            # only fetch public_primary_key and name fields needed by FilterEscalationChainSerializer,
+            # ordered by name so the (organization, name) unique index can serve the whole query
+            return queryset.only("public_primary_key", "name").order_by("name")
 
-        queryset = queryset.annotate(
-            num_integrations=Count(
-                "channel_filters__alert_receive_channel",
-                distinct=True,
-                filter=Q(channel_filters__alert_receive_channel__deleted_at__isnull=True),
-            )
-        ).annotate(
-            num_routes=Count(
-                "channel_filters",
-                distinct=True,
-                filter=Q(channel_filters__alert_receive_channel__deleted_at__isnull=True),
+        queryset = queryset.select_related("team")
+        if self.action not in ("list", "retrieve"):
+            # num_integrations and num_routes are only used by EscalationChainListSerializer
+            return queryset
+
+        # only fetch the fields needed by EscalationChainListSerializer, other actions need the full instance
+        queryset = queryset.only("public_primary_key", "name", "team__public_primary_key")
+
+        # count integrations and routes with correlated subqueries grouped by escalation chain,
+        # instead of joining channel filters and alert receive channels and de-duplicating the result
+        channel_filters = (
+            ChannelFilter.objects.filter(
+                escalation_chain=OuterRef("pk"),
+                alert_receive_channel__deleted_at__isnull=True,
             )
+            .order_by()
+            .values("escalation_chain")
+        )
+        num_integrations = channel_filters.annotate(
+            count=Count("alert_receive_channel_id", distinct=True),
+        ).values("count")
+        num_routes = channel_filters.annotate(count=Count("id")).values("count")
+
+        queryset = queryset.annotate(
+            num_integrations=Coalesce(Subquery(num_integrations, output_field=IntegerField()), 0),
+            num_routes=Coalesce(Subquery(num_routes, output_field=IntegerField()), 0),
         )
 
         return queryset
@@ -157,15 +195,23 @@ class EscalationChainViewSet(
 
         if not name:
             raise BadRequest(detail={"name": ["This field may not be null."]})
+
+        if not team_id:
+            team = None
+        elif obj.team is not None and obj.team.public_primary_key == team_id:
+            # obj is fetched filtering by available teams, so its own team is available to the user
+            team = obj.team
         else:
-            if EscalationChain.objects.filter(organization=request.auth.organization, name=name).exists():
-                raise BadRequest(detail={"name": ["Escalation chain with this name already exists."]})
+            try:
+                team = request.user.available_teams.get(public_primary_key=team_id)
+            except Team.DoesNotExist:
+                return Response(data={"error_code": "wrong_team"}, status=status.HTTP_403_FORBIDDEN)
 
+        # rely on the (organization, name) unique constraint instead of checking the name beforehand
         try:
-            team = request.user.available_teams.get(public_primary_key=team_id) if team_id else None
-        except Team.DoesNotExist:
-            return Response(data={"error_code": "wrong_team"}, status=status.HTTP_403_FORBIDDEN)
-        copy = obj.make_copy(name, team)
+            copy = obj.make_copy(name, team)
+        except IntegrityError:
+            raise BadRequest(detail={"name": ["Escalation chain with this name already exists."]})
         serializer = self.get_serializer(copy)
         write_resource_insight_log(
             instance=copy,
@@ -195,28 +241,41 @@ class EscalationChainViewSet(
     @action(methods=["get"], detail=True)
     def details(self, request, pk):
         obj = self.get_object()
-        channel_filters = obj.channel_filters.filter(alert_receive_channel__deleted_at__isnull=True).values(
-            "public_primary_key",
-            "filtering_term",
-            "is_default",
-            "alert_receive_channel__public_primary_key",
-            "alert_receive_channel__verbal_name",
+        channel_filters = (
+            obj.channel_filters.filter(alert_receive_channel__deleted_at__isnull=True).values(
+                "public_primary_key",
+                "filtering_term",
+                "is_default",
+                "alert_receive_channel__public_primary_key",
+                "alert_receive_channel__verbal_name",
+            )
+            # keep channel filters of the same integration next to each other, so they can be grouped in one pass
+            .order_by("alert_receive_channel_id", "is_default", "order")
+            # rows are consumed once, stream them instead of caching the whole result set
+            .iterator(chunk_size=500)
+        )
+        group_by_alert_receive_channel = itemgetter(
+            "alert_receive_channel__public_primary_key", "alert_receive_channel__verbal_name"
         )
-        data = {}
-        for channel_filter in channel_filters:
-            channel_filter_data = {
-                "display_name": "Default Route" if channel_filter["is_default"] else channel_filter["filtering_term"],
-                "id": channel_filter["public_primary_key"],
+        data = [
+            {
+                "id": alert_receive_channel_pk,
+                "display_name": _emojize_alias(alert_receive_channel_verbal_name),
+                "channel_filters": [
+                    {
+                        "display_name": "Default Route"
+                        if channel_filter["is_default"]
+                        else channel_filter["filtering_term"],
+                        "id": channel_filter["public_primary_key"],
+                    }
+                    for channel_filter in group
+                ],
             }
-            data.setdefault(
-                channel_filter["alert_receive_channel__public_primary_key"],
-                {
-                    "id": channel_filter["alert_receive_channel__public_primary_key"],
-                    "display_name": emojize(channel_filter["alert_receive_channel__verbal_name"], language="alias"),
-                    "channel_filters": [],
-                },
-            )["channel_filters"].append(channel_filter_data)
-        return Response(data.values())
+            for (alert_receive_channel_pk, alert_receive_channel_verbal_name), group in groupby(
+                channel_filters, key=group_by_alert_receive_channel
+            )
+        ]
+        return Response(data)
 
     @extend_schema(
         responses=inline_serializer(
@@ -232,16 +291,4 @@ class EscalationChainViewSet(
     )
     @action(methods=["get"], detail=False)
     def filters(self, request):
-        api_root = "/api/internal/v1/"
-
-        filter_options = [
-            {"name": "search", "type": "search"},
-            {
-                "name": "team",
-                "type": "team_select",
-                "href": api_root + "teams/",
-                "global": True,
-            },
-        ]
-
-        return Response(filter_options)
+        return Response(FILTER_OPTIONS)
@@ -1,10 +1,9 @@
 import datetime
-import functools
-import operator
+from collections import defaultdict
 
 import pytz
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Count, OuterRef, Prefetch, Q, Subquery
+from django.db.models import Count, Exists, OuterRef, Q
 from django.db.utils import IntegrityError
 from django.urls import reverse
 from django.utils import dateparse, timezone
@@ -12,7 +11,7 @@ from django.utils.functional import cached_property
 from django_filters import rest_framework as filters
 from rest_framework import mixins, status
 from rest_framework.decorators import action
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.fields import BooleanField
 from rest_framework.filters import SearchFilter
 from rest_framework.permissions import IsAuthenticated
@@ -59,6 +58,77 @@ EVENTS_FILTER_BY_FINAL = "final"
 SCHEDULE_TYPE_TO_CLASS = {
     str(num_type): cls for cls, num_type in PolymorphicScheduleSerializer.SCHEDULE_CLASS_TO_TYPE.items()
 }
+VALID_SCHEDULE_TYPES = frozenset(SCHEDULE_TYPE_TO_CLASS)
+
+# same values as accepted by BooleanField(allow_null=True), without instantiating a field per request
+_BOOL_MAP = {
+    **{value: True for value in BooleanField.TRUE_VALUES},
+    **{value: False for value in BooleanField.FALSE_VALUES},
+    **{value: None for value in BooleanField.NULL_VALUES},
+}
+
+
+def _parse_bool_query_param(value):
+    try:
+        return _BOOL_MAP[value]
+    except KeyError:
+        raise ValidationError(BooleanField.default_error_messages["invalid"], code="invalid")
+
+
+NOTIFY_ONCALL_SHIFT_FREQ_OPTIONS = [
+    {"value": value, "display_name": display_name}
+    for value, display_name in OnCallSchedule.NotifyOnCallShiftFreq.choices
+]
+
+NOTIFY_EMPTY_ONCALL_OPTIONS = [
+    {"value": value, "display_name": display_name} for value, display_name in OnCallSchedule.NotifyEmptyOnCall.choices
+]
+
+MENTION_OPTIONS = [
+    {
+        "value": False,
+        "display_name": "Inform in channel without mention",
+    },
+    {
+        "value": True,
+        "display_name": "Mention person in Slack",
+    },
+]
+
+FILTER_OPTIONS = [
+    {"name": "search", "type": "search"},
+    {
+        "name": "team",
+        "type": "team_select",
+        "href": "/api/internal/v1/teams/",
+        "global": True,
+    },
+    {
+        "name": "mine",
+        "type": "boolean",
+        "display_name": "Mine",
+        "default": "true",
+    },
+    {
+        "name": "used",
+        "type": "boolean",
+        "display_name": "Used in escalations",
+        "default": "false",
+    },
+    {
+        "name": "type",
+        "type": "options",
+        "options": [
+            {"display_name": "API", "value": 0},
+            {"display_name": "Ical", "value": 1},
+            {"display_name": "Web", "value": 2},
+        ],
+    },
+]
+
+
+# actions responding with serialized schedules, which need on-call users and user group warnings in the context
+SCHEDULE_SERIALIZING_ACTIONS = {"list", "retrieve", "create", "update", "partial_update"}
 
 
 class ScheduleFilter(ByTeamModelFieldFilterMixin, ModelFieldFilterMixin, filters.FilterSet):
@@ -114,6 +184,11 @@ class ScheduleView(
     short_serializer_class = ScheduleFastSerializer
     pagination_class = FifteenPageSizePaginator
 
+    @cached_property
+    def request_now(self):
+        """Current time, fixed for the whole request so all its computations use the same reference."""
+        return timezone.now()
+
     @cached_property
     def can_update_user_groups(self):
         """
@@ -137,55 +212,87 @@ class ScheduleView(
         The result of this method is cached and is reused for the whole lifetime of a request,
         since self.get_serializer_context() is called multiple times for every instance in the queryset.
         """
-        current_schedules = self.get_queryset(annotate=False).none()
-        events_datetime = datetime.datetime.now(datetime.timezone.utc)
+        current_schedules = self.get_queryset().none()
+        events_datetime = self.request_now
         if self.action == "list":
-            # listing page, only get oncall users for current page schedules, prefetch shift swap requests
-            current_schedules = self.filter_queryset(self.get_queryset(annotate=False)).prefetch_related(
-                self.prefetch_shift_swaps(
-                    queryset=ShiftSwapRequest.objects.filter(
-                        swap_start__lte=events_datetime, swap_end__gte=events_datetime
-                    )
+            # listing page, only get oncall users for current page schedules (already paginated by list()),
+            # prefetch shift swap requests
+            page = getattr(self.paginator, "page", None)
+            if page is not None:
+                current_schedules = list(page)
+                self.attach_shift_swaps(
+                    current_schedules,
+                    ShiftSwapRequest.objects.filter(swap_start__lte=events_datetime, swap_end__gte=events_datetime),
                 )
-            )
-            current_schedules = self.paginate_queryset(current_schedules)
         elif self.kwargs.get("pk"):
             # if this is a particular schedule detail, only consider it as current
             current_schedules = [self.get_object(annotate=False)]
         return get_oncall_users_for_multiple_schedules(current_schedules, events_datetime)
 
     @staticmethod
-    def prefetch_shift_swaps(queryset):
-        return Prefetch(
-            "shift_swap_requests",
-            queryset=queryset.select_related("benefactor", "beneficiary").order_by("created_at"),
-            to_attr=PREFETCHED_SHIFT_SWAPS,
+    def attach_shift_swaps(schedules, queryset):
+        """Fetch shift swap requests for all the given schedules in a single query and attach them to each schedule."""
+        swaps_by_schedule = defaultdict(list)
+        swaps = (
+            queryset.filter(schedule_id__in=[schedule.pk for schedule in schedules])
+            .select_related("benefactor", "beneficiary")
+            # description is not used when applying swaps to events
+            .defer("description")
+            .order_by("created_at")
         )
+        for swap in swaps:
+            swaps_by_schedule[swap.schedule_id].append(swap)
+        for schedule in schedules:
+            setattr(schedule, PREFETCHED_SHIFT_SWAPS, swaps_by_schedule[schedule.pk])
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
+        if self.action not in SCHEDULE_SERIALIZING_ACTIONS:
+            # e.g. options or metadata requests, no schedule is serialized
+            return context
         context.update({"can_update_user_groups": self.can_update_user_groups})
         context.update({"oncall_users": self.oncall_users})
         return context
 
-    def _annotate_queryset(self, queryset):
-        """Annotate queryset with additional schedule metadata."""
-        escalation_policies = (
-            EscalationPolicy.objects.values("notify_schedule")
-            .order_by("notify_schedule")
-            .annotate(num_escalation_chains=Count("notify_schedule"))
-            .filter(notify_schedule=OuterRef("id"))
+    def _annotate_schedules(self, schedules):
+        """
+        Attach additional schedule metadata to already fetched schedules.
+        Counts are computed with a single grouped query instead of a correlated subquery per row.
+        """
+        num_escalation_chains = dict(
+            EscalationPolicy.objects.filter(notify_schedule__in=[schedule.pk for schedule in schedules])
+            .order_by()
+            .values("notify_schedule")
+            .annotate(num_escalation_chains=Count("pk"))
+            .values_list("notify_schedule", "num_escalation_chains")
         )
-        queryset = queryset.annotate(
-            num_escalation_chains=Subquery(escalation_policies.values("num_escalation_chains")[:1]),
+        for schedule in schedules:
+            schedule.num_escalation_chains = num_escalation_chains.get(schedule.pk, 0)
+        return schedules
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        is_short_request = self.request.query_params.get("short", "false") == "true"
+        if page is not None and not is_short_request:
+            self._annotate_schedules(page)
+        return page
+
+    def _filter_by_available_teams(self, queryset):
+        available_teams_lookup_args = self.available_teams_lookup_args
+        if not available_teams_lookup_args:
+            return queryset
+        # semi-join on pk instead of .distinct() over the whole (wide) schedule row
+        return queryset.filter(
+            pk__in=OnCallSchedule.objects.filter(organization=self.request.auth.organization)
+            .filter(*available_teams_lookup_args)
+            .values("pk"),
         )
-        return queryset
 
-    def get_queryset(self, ignore_filtering_by_available_teams=False, annotate=True):
+    def get_queryset(self, ignore_filtering_by_available_teams=False):
         is_short_request = self.request.query_params.get("short", "false") == "true"
         filter_by_type = self.request.query_params.getlist("type")
-        mine = BooleanField(allow_null=True).to_internal_value(data=self.request.query_params.get("mine"))
-        used = BooleanField(allow_null=True).to_internal_value(data=self.request.query_params.get("used"))
+        mine = _parse_bool_query_param(self.request.query_params.get("mine"))
+        used = _parse_bool_query_param(self.request.query_params.get("used"))
         organization = self.request.auth.organization
         queryset = OnCallSchedule.objects.filter(organization=organization).defer(
             # avoid requesting large text fields which are not used when listing schedules
@@ -194,19 +301,17 @@ class ScheduleView(
             "cached_ical_final_schedule",
         )
         if not ignore_filtering_by_available_teams:
-            queryset = queryset.filter(*self.available_teams_lookup_args).distinct()
+            queryset = self._filter_by_available_teams(queryset)
         if not is_short_request:
-            if annotate:
-                queryset = self._annotate_queryset(queryset)
             queryset = self.serializer_class.setup_eager_loading(queryset)
         if filter_by_type:
-            valid_types = [i for i in filter_by_type if i in SCHEDULE_TYPE_TO_CLASS]
+            valid_types = [i for i in filter_by_type if i in VALID_SCHEDULE_TYPES]
             if valid_types:
-                queryset = functools.reduce(
-                    operator.or_, [queryset.filter().instance_of(SCHEDULE_TYPE_TO_CLASS[i]) for i in valid_types]
-                )
+                # a single polymorphic_ctype IN (...) filter instead of OR-ing a queryset per type
+                queryset = queryset.instance_of(*(SCHEDULE_TYPE_TO_CLASS[i] for i in valid_types))
         if used is not None:
-            queryset = queryset.filter(escalation_policies__isnull=not used).distinct()
+            has_escalation_policies = Exists(EscalationPolicy.objects.filter(notify_schedule=OuterRef("pk")))
+            queryset = queryset.filter(has_escalation_policies if used else ~has_escalation_policies)
         if mine:
             user = self.request.user
             queryset = queryset.related_to_user(user)
@@ -246,14 +351,19 @@ class ScheduleView(
         if instance.user_group is not None:
             update_slack_user_group_for_schedules.apply_async((instance.user_group.pk,))
 
-    def get_object(self, annotate=True) -> OnCallSchedule:
+    def get_object(self, annotate=None) -> OnCallSchedule:
         # get the object from the whole organization if there is a flag `get_from_organization=true`
         # otherwise get the object from the current team
+        if annotate is None:
+            # e.g. destroy doesn't serialize the schedule, skip counting its escalation chains
+            annotate = self.action in SCHEDULE_SERIALIZING_ACTIONS
         get_from_organization: bool = self.request.query_params.get("from_organization", "false") == "true"
         if get_from_organization:
             return self.get_object_from_organization(annotate=annotate)
-        queryset_kwargs = {"annotate": annotate}
-        return super().get_object(queryset_kwargs)
+        obj = super().get_object()
+        if annotate:
+            self._annotate_schedules([obj])
+        return obj
 
     def get_object_from_organization(self, ignore_filtering_by_available_teams=False, annotate=True):
         # use this method to get the object from the whole organization instead of the current team
@@ -263,11 +373,10 @@ class ScheduleView(
             public_primary_key=pk,
         )
         if not ignore_filtering_by_available_teams:
-            queryset = queryset.filter(*self.available_teams_lookup_args).distinct()
+            queryset = self._filter_by_available_teams(queryset)
 
-        if annotate:
-            queryset = self._annotate_queryset(queryset)
-            queryset = self.serializer_class.setup_eager_loading(queryset)
+        # related objects (e.g. slack_channel) are also needed by detail actions such as events
+        queryset = self.serializer_class.setup_eager_loading(queryset)
 
         try:
             obj = queryset.get()
@@ -277,13 +386,15 @@ class ScheduleView(
         # May raise a permission denied
         self.check_object_permissions(self.request, obj)
 
+        if annotate:
+            self._annotate_schedules([obj])
         return obj
 
     def get_request_timezone(self):
         user_tz = self.request.query_params.get("user_tz", "UTC")
         raise_exception_if_not_valid_timezone(user_tz)
 
-        date = timezone.now().date()
+        date = self.request_now.date()
         date_param = self.request.query_params.get("date")
         if date_param is not None:
             try:
@@ -323,7 +434,7 @@ class ScheduleView(
         result = {
             "id": schedule.public_primary_key,
             "name": schedule.name,
-            "type": PolymorphicScheduleSerializer().to_resource_type(schedule),
+            "type": PolymorphicScheduleSerializer.SCHEDULE_CLASS_TO_TYPE.get(schedule._meta.model),
             "slack_channel": slack_channel,
             "events": events,
         }
@@ -362,7 +473,7 @@ class ScheduleView(
         result = {
             "id": schedule.public_primary_key,
             "name": schedule.name,
-            "type": PolymorphicScheduleSerializer().to_resource_type(schedule),
+            "type": PolymorphicScheduleSerializer.SCHEDULE_CLASS_TO_TYPE.get(schedule._meta.model),
             "events": events,
         }
         return Response(result, status=status.HTTP_200_OK)
@@ -390,20 +501,29 @@ class ScheduleView(
         """Return next shift for users in schedule."""
         days = self.request.query_params.get("days")
         days = int(days) if days else 30
-        now = timezone.now()
+        now = self.request_now
         datetime_end = now + datetime.timedelta(days=days)
         schedule = self.get_object(annotate=False)
 
         users = {}
         events = schedule.final_events(now, datetime_end)
-        users_tz = {u.public_primary_key: u.timezone for u in schedule.related_users()}
-        added_users = set()
+        # User.timezone falls back to the user's Slack identity timezone, fetch both in a single query
+        related_users = (
+            schedule.related_users()
+            .select_related("slack_user_identity")
+            .only("public_primary_key", "_timezone", "slack_user_identity")
+        )
+        users_tz = {u.public_primary_key: u.timezone for u in related_users}
         for e in events:
-            user_ppk = e["users"][0]["pk"] if e["users"] else None
-            if user_ppk is not None and user_ppk not in users and user_ppk in users_tz and e["end"] > now:
+            # stop as soon as every related user has a next shift
+            if len(users) >= len(users_tz):
+                break
+            if e["end"] <= now or not e["users"]:
+                continue
+            user_ppk = e["users"][0]["pk"]
+            if user_ppk not in users and user_ppk in users_tz:
                 users[user_ppk] = e
                 users[user_ppk]["user_timezone"] = users_tz[user_ppk]
-                added_users.add(user_ppk)
 
         result = {"users": users}
         return Response(result, status=status.HTTP_200_OK)
@@ -411,17 +531,22 @@ class ScheduleView(
     @action(detail=True, methods=["get"])
     def related_users(self, request, pk):
         schedule = self.get_object(annotate=False)
-        serializer = ScheduleUserSerializer(schedule.related_users(), many=True)
+        users = ScheduleUserSerializer.setup_eager_loading(schedule.related_users())
+        serializer = ScheduleUserSerializer(users, many=True)
         result = {"users": serializer.data}
         return Response(result, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=["get"])
     def related_escalation_chains(self, request, pk):
         """Return escalation chains associated to schedule."""
-        schedule = self.get_object(annotate=True)
-        escalation_chains = EscalationChain.objects.filter(escalation_policies__notify_schedule=schedule).distinct()
+        schedule = self.get_object(annotate=False)
+        escalation_chains = (
+            EscalationChain.objects.filter(escalation_policies__notify_schedule=schedule)
+            .values("name", "public_primary_key")
+            .distinct()
+        )
 
-        result = [{"name": e.name, "pk": e.public_primary_key} for e in escalation_chains]
+        result = [{"name": e["name"], "pk": e["public_primary_key"]} for e in escalation_chains]
         return Response(result, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=["get"])
@@ -441,17 +566,18 @@ class ScheduleView(
         pytz_tz = pytz.timezone(user_tz)
         datetime_start = datetime.datetime.combine(starting_date, datetime.time.min, tzinfo=pytz_tz)
         datetime_end = datetime_start + datetime.timedelta(days=days)
-        schedules = (
+        # shifts are read from the cached final schedule, avoid requesting the previous ical files
+        schedules = list(
             OnCallSchedule.objects.related_to_user(self.request.user)
+            .defer("prev_ical_file_primary", "prev_ical_file_overrides")
             .select_related("organization")
-            .prefetch_related(
-                self.prefetch_shift_swaps(
-                    queryset=ShiftSwapRequest.objects.filter(
-                        Q(swap_start__lt=datetime_start, swap_end__gte=datetime_start)
-                        | Q(swap_start__gte=datetime_start, swap_start__lte=datetime_end)
-                    )
-                )
-            )
+        )
+        self.attach_shift_swaps(
+            schedules,
+            ShiftSwapRequest.objects.filter(
+                Q(swap_start__lt=datetime_start, swap_end__gte=datetime_start)
+                | Q(swap_start__gte=datetime_start, swap_start__lte=datetime_end)
+            ),
         )
         schedules_events = []
         is_oncall = False
@@ -459,13 +585,15 @@ class ScheduleView(
             passed_shifts, current_shifts, upcoming_shifts = schedule.shifts_for_user(
                 user=self.request.user, datetime_start=datetime_start, days=days
             )
-            all_shifts = passed_shifts + current_shifts + upcoming_shifts
-            if all_shifts:
+            if passed_shifts or current_shifts or upcoming_shifts:
                 schedules_events.append(
-                    {"id": schedule.public_primary_key, "name": schedule.name, "events": all_shifts}
+                    {
+                        "id": schedule.public_primary_key,
+                        "name": schedule.name,
+                        "events": [*passed_shifts, *current_shifts, *upcoming_shifts],
+                    }
                 )
-                if current_shifts and not is_oncall:
-                    is_oncall = True
+                is_oncall = is_oncall or bool(current_shifts)
         result = {"schedules": schedules_events, "is_oncall": is_oncall}
         return Response(result, status=status.HTTP_200_OK)
 
@@ -536,75 +664,16 @@ class ScheduleView(
 
     @action(detail=False, methods=["get"])
     def notify_oncall_shift_freq_options(self, request):
-        options = []
-        for choice in OnCallSchedule.NotifyOnCallShiftFreq.choices:
-            options.append(
-                {
-                    "value": choice[0],
-                    "display_name": choice[1],
-                }
-            )
-        return Response(options)
+        return Response(NOTIFY_ONCALL_SHIFT_FREQ_OPTIONS)
 
     @action(detail=False, methods=["get"])
     def notify_empty_oncall_options(self, request):
-        options = []
-        for choice in OnCallSchedule.NotifyEmptyOnCall.choices:
-            options.append(
-                {
-                    "value": choice[0],
-                    "display_name": choice[1],
-                }
-            )
-        return Response(options)
+        return Response(NOTIFY_EMPTY_ONCALL_OPTIONS)
 
     @action(detail=False, methods=["get"])
     def mention_options(self, request):
-        options = [
-            {
-                "value": False,
-                "display_name": "Inform in channel without mention",
-            },
-            {
-                "value": True,
-                "display_name": "Mention person in Slack",
-            },
-        ]
-        return Response(options)
+        return Response(MENTION_OPTIONS)
 
     @action(methods=["get"], detail=False)
     def filters(self, request):
-        api_root = "/api/internal/v1/"
-
-        filter_options = [
-            {"name": "search", "type": "search"},
-            {
-                "name": "team",
-                "type": "team_select",
-                "href": api_root + "teams/",
-                "global": True,
-            },
-            {
-                "name": "mine",
-                "type": "boolean",
-                "display_name": "Mine",
-                "default": "true",
-            },
-            {
-                "name": "used",
-                "type": "boolean",
-                "display_name": "Used in escalations",
-                "default": "false",
-            },
-            {
-                "name": "type",
-                "type": "options",
-                "options": [
-                    {"display_name": "API", "value": 0},
-                    {"display_name": "Ical", "value": 1},
-                    {"display_name": "Web", "value": 2},
-                ],
-            },
-        ]
-
-        return Response(filter_options)
+        return Response(FILTER_OPTIONS)
@@ -1,11 +1,15 @@
 # Generated by Django 4.2.15 on 2024-10-17 19:19
 import logging
 
-from django.db import migrations
+from django.db import migrations, transaction
+from django.db.models import Exists, Max, Min, OuterRef, Subquery
 import django_migration_linter as linter
 
 logger = logging.getLogger(__name__)
 
+# size of the organization id ranges updated at a time on mysql
+MYSQL_UPDATE_ID_RANGE = 50_000
+
 
 def populate_default_slack_channel(apps, schema_editor):
     Organization = apps.get_model("user_management", "Organization")
@@ -13,69 +17,84 @@ def populate_default_slack_channel(apps, schema_editor):
 
     logger.info("Starting migration to populate default_slack_channel field.")
 
-    # NOTE: the following raw SQL only works on mysql, fall back to the less-efficient (but working) ORM method
-    # for non-mysql databases
+    # skip organizations already populated, so re-running is cheap
+    queryset = Organization.objects.filter(
+        general_log_channel_id__isnull=False,
+        slack_team_identity__isnull=False,
+        default_slack_channel__isnull=True,
+    )
+    if not queryset.exists():
+        # e.g. fresh installations, nothing to migrate
+        logger.info("No organizations need updating.")
+        return
+
+    # NOTE: the following raw SQL is vendor specific (mysql and postgresql), fall back to a single ORM update
+    # with a correlated subquery for other databases
     #
     # see the following references for more information:
     # https://github.com/grafana/oncall/issues/5244#issuecomment-2493688544
     # https://github.com/grafana/oncall/pull/5233/files#diff-e69e0d7ecf51300be2ca5f4239c5f08b4c6e41de9856788f85a522001595a192
-    if schema_editor.connection.vendor == "mysql":
+    connection = schema_editor.connection
+    vendor = connection.vendor
+    quote_name = connection.ops.quote_name
+    org_table = quote_name(Organization._meta.db_table)
+    sc_table = quote_name(SlackChannel._meta.db_table)
+    if vendor == "mysql":
         sql = f"""
-        UPDATE {Organization._meta.db_table} AS org
-        JOIN {SlackChannel._meta.db_table} AS sc ON sc.slack_id = org.general_log_channel_id
+        UPDATE {org_table} AS org
+        JOIN {sc_table} AS sc ON sc.slack_id = org.general_log_channel_id
                             AND sc.slack_team_identity_id = org.slack_team_identity_id
         SET org.default_slack_channel_id = sc.id
         WHERE org.general_log_channel_id IS NOT NULL
-        AND org.slack_team_identity_id IS NOT NULL;
+        AND org.slack_team_identity_id IS NOT NULL
+        AND org.default_slack_channel_id IS NULL
+        AND org.id BETWEEN %s AND %s;
+        """
+
+        # update organizations by id range, each range in its own short transaction,
+        # instead of locking every qualifying row for the duration of a single statement
+        updated_rows = 0
+        # only walk the id span of organizations still needing an update
+        ids = queryset.aggregate(min_id=Min("id"), max_id=Max("id"))
+        if ids["min_id"] is not None:
+            # the statement is built once, each range only binds its bounds
+            with connection.cursor() as cursor:
+                for lo in range(ids["min_id"], ids["max_id"] + 1, MYSQL_UPDATE_ID_RANGE):
+                    with transaction.atomic(using=connection.alias):
+                        cursor.execute(sql, [lo, lo + MYSQL_UPDATE_ID_RANGE - 1])
+                        updated_rows += cursor.rowcount  # Number of rows updated
+    elif vendor == "postgresql":
+        sql = f"""
+        UPDATE {org_table} AS org
+        SET default_slack_channel_id = sc.id
+        FROM {sc_table} AS sc
+        WHERE sc.slack_id = org.general_log_channel_id
+        AND sc.slack_team_identity_id = org.slack_team_identity_id
+        AND org.general_log_channel_id IS NOT NULL
+        AND org.slack_team_identity_id IS NOT NULL
+        AND org.default_slack_channel_id IS NULL;
         """
 
-        with schema_editor.connection.cursor() as cursor:
+        with connection.cursor() as cursor:
             cursor.execute(sql)
             updated_rows = cursor.rowcount  # Number of rows updated
-
-        logger.info(f"Bulk updated {updated_rows} organizations with their default Slack channel.")
-        logger.info("Finished migration to populate default_slack_channel field.")
     else:
-        queryset = Organization.objects.filter(general_log_channel_id__isnull=False, slack_team_identity__isnull=False)
-        total_orgs = queryset.count()
-        updated_orgs = 0
-        missing_channels = 0
-        organizations_to_update = []
-
-        logger.info(f"Total organizations to process: {total_orgs}")
-
-        for org in queryset:
-            slack_id = org.general_log_channel_id
-            slack_team_identity = org.slack_team_identity
-
-            try:
-                slack_channel = SlackChannel.objects.get(slack_id=slack_id, slack_team_identity=slack_team_identity)
-
-                org.default_slack_channel = slack_channel
-                organizations_to_update.append(org)
-
-                updated_orgs += 1
-                logger.info(
-                    f"Organization {org.id} updated with SlackChannel {slack_channel.id} (slack_id: {slack_id})."
-                )
-            except SlackChannel.DoesNotExist:
-                missing_channels += 1
-                logger.warning(
-                    f"SlackChannel with slack_id {slack_id} and slack_team_identity {slack_team_identity} "
-                    f"does not exist for Organization {org.id}."
-                )
-
-        if organizations_to_update:
-            Organization.objects.bulk_update(organizations_to_update, ["default_slack_channel"])
-            logger.info(f"Bulk updated {len(organizations_to_update)} organizations with their default Slack channel.")
-
-        logger.info(
-            f"Finished migration. Total organizations processed: {total_orgs}. "
-            f"Organizations updated: {updated_orgs}. Missing SlackChannels: {missing_channels}."
+        # single UPDATE ... SET default_slack_channel_id = (SELECT ...) statement, works on any database
+        slack_channels = SlackChannel.objects.filter(
+            slack_id=OuterRef("general_log_channel_id"),
+            slack_team_identity_id=OuterRef("slack_team_identity_id"),
+        )
+        updated_rows = queryset.filter(Exists(slack_channels)).update(
+            default_slack_channel_id=Subquery(slack_channels.values("id")[:1])
         )
 
+    logger.info(f"Bulk updated {updated_rows} organizations with their default Slack channel.")
+    logger.info("Finished migration to populate default_slack_channel field.")
+
 
 class Migration(migrations.Migration):
+    # on mysql data is updated by id ranges, each one in its own transaction (see populate_default_slack_channel)
+    atomic = False
 
     dependencies = [
         ("user_management", "0025_organization_default_slack_channel"),
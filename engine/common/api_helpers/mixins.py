@@ -54,9 +54,13 @@ class FilterSerializerMixin:
     serializer_class = None
     filter_serializer_class = None
 
+    @cached_property
+    def is_filters_request(self) -> bool:
+        # cached for the lifetime of a request, it's read both by get_queryset and get_serializer_class
+        return self.request.query_params.get("filters", "false") == "true"
+
     def get_serializer_class(self):
-        is_filters_request = self.request.query_params.get("filters", "false") == "true"
-        if self.action in ["list"] and is_filters_request:
+        if self.action in ["list"] and self.is_filters_request:
             return self.get_filter_serializer_class()
         else:
             return super().get_serializer_class()